@@ -21,28 +21,52 @@ import hashlib
 import hmac
 import subprocess
 import platform
+import queue
 import random
+import shutil
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from itertools import islice
 from math import ceil
 import atexit
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+
+try:
+    import orjson  # optional, faster encoding for large responses
+except ImportError:
+    orjson = None
+
+try:
+    import psutil  # targeted Chrome termination; taskkill fallback without it
+except ImportError:
+    psutil = None
 
 app = Flask(__name__)
+app.config["JSON_SORT_KEYS"] = False
+app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
+if hasattr(app, "json"):  # Flask >= 2.2 JSON provider ignores the config keys above
+    app.json.sort_keys = False
+    app.json.compact = True
 
 # ---------------- CONFIG ---------------- #
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 STATE_FILENAME = os.path.join(SCRIPT_DIR, "server_state.json")
+STATE_LOG_FILENAME = os.path.join(SCRIPT_DIR, "server_state.log")
 CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 USER_DATA_DIR = os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\User Data")
 TARGET_URL = "https://m.poppolive.com/live/room/?l=&roomid=26343308"
 CONFIG_FILENAME = "zoee_profile_manager_config.json"
 PBKDF2_ITERATIONS = 200_000
 TOKEN_TTL = 60 * 60 * 24  # tokens valid 24h
+TOKEN_PURGE_EVERY = 10  # autosave ticks between expired-token sweeps
 DEFAULT_PASSWORD = "1234"
 
 opened_profiles = set()
+_launching = set()  # profiles queued or mid-launch, so repeat requests don't double-launch
+_launch_generation = 0  # bumped by close_all_profiles to invalidate queued launches
 profile_proxies = {}
-_activity_log = []
 _valid_tokens = {}
 
 # Rotation and safety tuned for large fleets (500-1000)
@@ -63,74 +87,216 @@ SAFETY = {
     "rotation_groups": 3,
     "max_log_items": 2000,
     "state_autosave_interval": 60,  # seconds
+    "state_log_checkpoint_lines": 1000,  # checkpoint once the event log reaches this size
 }
 
-# Lock for shared state
-_state_lock = threading.Lock()
+# Bounded activity log; the deque drops the oldest line in O(1) once full
+_activity_log = deque(maxlen=SAFETY["max_log_items"])
+_log_seq = 0  # sequence number of the newest line in _activity_log (first line is 1)
+_BOOT_ID = secrets.token_hex(8)  # identifies this process, so /logs clients can detect a restart
+
+# Per-domain locks so logging, profile safety state and rotation don't serialize
+# each other. When more than one is needed, acquire in this order:
+# _checkpoint_lock -> _state_lock -> _profile_state_lock -> _rotation_lock -> _state_log_lock.
+_checkpoint_lock = threading.Lock()     # one checkpoint write at a time (_save_state)
+_state_lock = threading.Lock()          # tokens, proxies, launched profiles, password/profile-list caches
+_log_lock = threading.Lock()            # _activity_log, _log_seq
+_profile_state_lock = threading.Lock()  # per-profile safety arrays (_ps_*)
+_rotation_lock = threading.Lock()       # _rotation_state
+_state_log_lock = threading.Lock()      # event-log file and _state_log_lines
 
 # ---------------- Utilities ---------------- #
 def config_path():
     return os.path.join(SCRIPT_DIR, CONFIG_FILENAME)
 
-def _log_trim():
-    if len(_activity_log) > SAFETY["max_log_items"]:
-        del _activity_log[0 : len(_activity_log) - SAFETY["max_log_items"]]
+def _json_dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def json_response(obj, status=200):
+    """Encode obj with orjson when available (used by the large/hot endpoints)."""
+    return Response(_json_dumps(obj), status=status, mimetype="application/json")
+
+# Console output is handed to a daemon thread so a slow terminal never stalls callers
+_log_queue = queue.SimpleQueue()
+
+def _print_line(line):
+    try:
+        print(line)
+    except Exception:
+        pass  # closed/redirected stdout or unencodable text; line is still in _activity_log
+
+def _log_printer():
+    while True:
+        _print_line(_log_queue.get())
+
+def _flush_log_queue():
+    while True:
+        try:
+            _print_line(_log_queue.get_nowait())
+        except queue.Empty:
+            return
+
+_log_printer_thread = threading.Thread(target=_log_printer, daemon=True)
+_log_printer_thread.start()
 
 def log(msg: str):
+    global _log_seq
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] {msg}"
-    with _state_lock:
+    with _log_lock:
         _activity_log.append(line)
-        _log_trim()
-    print(line)
+        _log_seq += 1
+    _log_queue.put_nowait(line)
+
+# ---------------- Persistence (JSON checkpoint + append-only event log) ---------------- #
+# Every state mutation appends one small JSON line to STATE_LOG_FILENAME; the full
+# state is only rewritten to STATE_FILENAME (a checkpoint) once the log grows past
+# SAFETY["state_log_checkpoint_lines"] or on shutdown. Events carry the resulting
+# values, so replaying them over a checkpoint is idempotent.
+_state_log_lines = 0
+_state_dirty = threading.Event()  # set on every mutation, cleared by a checkpoint
+
+def _append_state_event(op, **fields):
+    """Append one delta record to the state log. Caller must hold the lock of the state recorded."""
+    global _state_log_lines
+    record = {"t": time.time(), "op": op}
+    record.update(fields)
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _state_log_lock:
+        _state_dirty.set()
+        try:
+            with open(STATE_LOG_FILENAME, "a", encoding="utf-8") as f:
+                f.write(line)
+            _state_log_lines += 1
+        except OSError:
+            pass  # the change is still captured by the next checkpoint
+
+def _apply_state_event(ev):
+    op = ev.get("op")
+    if op == "rotation":
+        _rotation_state.update(ev.get("s", {}))
+    elif op == "proxy":
+        profile_proxies.update(ev.get("s", {}))
+    elif ev.get("p"):
+        _set_profile_record(ev["p"], ev.get("s", {}))
+
+def _replay_state_log(path):
+    if not os.path.exists(path):
+        return 0
+    replayed = 0
+    line = "\n"
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            _apply_state_event(ev)
+            replayed += 1
+    if not line.endswith("\n"):
+        # terminate a torn tail so the next append starts on its own line
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+    return replayed
+
+def _rotate_state_log():
+    """Move the live log aside so events logged after a snapshot land in a fresh file."""
+    if not os.path.exists(STATE_LOG_FILENAME):
+        return
+    pending = STATE_LOG_FILENAME + ".1"
+    if os.path.exists(pending):
+        # leftover from an interrupted checkpoint; keep its events
+        with open(STATE_LOG_FILENAME, "rb") as src, open(pending, "ab") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(STATE_LOG_FILENAME)
+    else:
+        os.replace(STATE_LOG_FILENAME, pending)
 
-# ---------------- Persistence (JSON) ---------------- #
 def _load_state():
-    global _rotation_state, _profile_state, profile_proxies
-    if not os.path.exists(STATE_FILENAME):
+    global _state_log_lines
+    has_log = os.path.exists(STATE_LOG_FILENAME) or os.path.exists(STATE_LOG_FILENAME + ".1")
+    if not os.path.exists(STATE_FILENAME) and not has_log:
         log("No saved state file found; starting fresh.")
         return
     try:
-        with open(STATE_FILENAME, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        with _state_lock:
+        data = {}
+        if os.path.exists(STATE_FILENAME):
+            with open(STATE_FILENAME, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        with _state_lock, _profile_state_lock, _rotation_lock, _state_log_lock:
             _rotation_state.update(data.get("rotation_state", {}))
             # load profile state values, ensure numeric types where needed
             saved_profiles = data.get("profile_state", {})
             for k, v in saved_profiles.items():
-                _profile_state[k] = {
-                    "last_refresh": float(v.get("last_refresh", 0)),
-                    "failures": int(v.get("failures", 0)),
-                    "next_allowed": float(v.get("next_allowed", 0)),
-                    "quarantined": bool(v.get("quarantined", False)),
-                }
+                _set_profile_record(k, v)
             profile_proxies.update(data.get("profile_proxies", {}))
-        log("Loaded persisted state from disk.")
+            replayed = _replay_state_log(STATE_LOG_FILENAME + ".1") + _replay_state_log(STATE_LOG_FILENAME)
+            _state_log_lines = replayed
+            if replayed:
+                _state_dirty.set()
+        log(f"Loaded persisted state from disk (replayed {replayed} logged events).")
     except Exception as e:
         log(f"Failed to load persisted state: {e}")
 
 def _save_state():
+    """Write a full checkpoint and start a fresh event log; no-op when nothing changed."""
+    if not _state_dirty.is_set():
+        return
+    with _checkpoint_lock:
+        _write_checkpoint()
+
+def _write_checkpoint():
+    """Caller must hold _checkpoint_lock, which serializes snapshot, tmp write and replace."""
+    global _state_log_lines
+    if not _state_dirty.is_set():
+        return  # a concurrent checkpoint already covered these changes
     try:
-        with _state_lock:
+        with _state_lock, _profile_state_lock, _rotation_lock, _state_log_lock:
+            # copy under the locks; json.dump below runs unlocked against this snapshot
             data = {
-                "rotation_state": _rotation_state,
-                "profile_state": _profile_state,
-                "profile_proxies": profile_proxies,
+                "rotation_state": dict(_rotation_state),
+                "profile_state": {name: _profile_record(i) for i, name in enumerate(_ps_names)},
+                "profile_proxies": dict(profile_proxies),
                 "ts": time.time(),
             }
-        with open(STATE_FILENAME, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        log("Saved state to disk.")
+            _rotate_state_log()
+            _state_log_lines = 0
+            _state_dirty.clear()
+        # write-then-rename so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = STATE_FILENAME + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())  # data must be durable before the rename and the .log.1 removal
+        os.replace(tmp_path, STATE_FILENAME)
+        if os.name != "nt":  # persist the rename itself (directory fsync is POSIX-only)
+            dir_fd = os.open(os.path.dirname(STATE_FILENAME), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        try:
+            os.remove(STATE_LOG_FILENAME + ".1")
+        except FileNotFoundError:
+            pass
+        log("Saved state checkpoint to disk.")
     except Exception as e:
+        _state_dirty.set()
         log(f"Failed to save state: {e}")
 
 # Autosave background thread
 _autosave_stop = threading.Event()
 def _autosave_worker():
-    while not _autosave_stop.is_set():
-        time.sleep(SAFETY.get("state_autosave_interval", 60))
+    ticks = 0
+    while not _autosave_stop.wait(SAFETY.get("state_autosave_interval", 60)):
+        ticks += 1
         try:
-            _save_state()
+            if _state_log_lines >= SAFETY["state_log_checkpoint_lines"]:
+                _save_state()
+            if ticks % TOKEN_PURGE_EVERY == 0:
+                _purge_expired_tokens()
         except Exception:
             pass
 
@@ -150,35 +316,70 @@ def _stop_autosave():
 # Ensure save on exit
 def _on_exit_save():
     log("Shutdown: saving state to disk...")
-    _save_state()
     _stop_autosave()
+    _save_state()
+    _launcher_pool.shutdown(wait=False, cancel_futures=True)
+    _flush_log_queue()
 
 atexit.register(_on_exit_save)
 
 # ---------------- Password utilities ---------------- #
+# Parsed (salt, dk, iterations) from the config file; refreshed by save_password_hash
+_pw_cache = None
+
 def save_password_hash(salt: bytes, dk: bytes, iterations=PBKDF2_ITERATIONS):
+    global _pw_cache
     entry = {
         "salt": base64.b64encode(salt).decode("utf-8"),
         "dk": base64.b64encode(dk).decode("utf-8"),
         "iterations": iterations,
     }
-    with open(config_path(), "w", encoding="utf-8") as f:
-        json.dump(entry, f)
+    with _state_lock:
+        with open(config_path(), "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        _pw_cache = (salt, dk, iterations)
 
 def load_password_hash():
+    global _pw_cache
+    cached = _pw_cache
+    if cached is not None:
+        return cached
     try:
         with open(config_path(), "r", encoding="utf-8") as f:
             entry = json.load(f)
-        return (
+        loaded = (
             base64.b64decode(entry["salt"]),
             base64.b64decode(entry["dk"]),
             int(entry.get("iterations", PBKDF2_ITERATIONS)),
         )
     except Exception:
         return None
+    with _state_lock:
+        if _pw_cache is None:
+            _pw_cache = loaded
+        return _pw_cache
+
+def _select_pbkdf2_sha256():
+    """Prefer OpenSSL's PBKDF2 (SHA-NI accelerated), then cryptography, then hashlib's pure-Python fallback."""
+    fn = getattr(hashlib, "pbkdf2_hmac", None)
+    if fn is not None and getattr(fn, "__module__", "") == "_hashlib":
+        return (lambda pw, salt, iters: fn("sha256", pw, salt, iters, dklen=32)), "openssl"
+    try:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    except ImportError:
+        if fn is None:
+            raise RuntimeError("no PBKDF2 implementation available (Python built without OpenSSL)")
+        return (lambda pw, salt, iters: fn("sha256", pw, salt, iters, dklen=32)), "python"
+
+    def _derive(pw, salt, iters):
+        return PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iters).derive(pw)
+    return _derive, "cryptography"
+
+_pbkdf2_sha256, PBKDF2_BACKEND = _select_pbkdf2_sha256()
 
 def derive_key(password: str, salt: bytes, iterations=PBKDF2_ITERATIONS):
-    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=32)
+    return _pbkdf2_sha256(password.encode(), salt, iterations)
 
 def ensure_password_exists():
     if not load_password_hash():
@@ -205,6 +406,15 @@ def set_new_password(new_password: str):
 def generate_token():
     return secrets.token_hex(24)
 
+def _purge_expired_tokens():
+    now = time.time()
+    with _state_lock:
+        expired = [t for t, exp in _valid_tokens.items() if exp < now]
+        for t in expired:
+            del _valid_tokens[t]
+    if expired:
+        log(f"Purged {len(expired)} expired auth tokens")
+
 def extract_token():
     token = request.headers.get("X-Auth-Token")
     if not token:
@@ -222,118 +432,310 @@ def require_token(f):
             return jsonify(ok=False, error="auth token required"), 401
         expiry = _valid_tokens.get(token)
         if not expiry or expiry < time.time():
+            if expiry:
+                with _state_lock:
+                    _valid_tokens.pop(token, None)
             log(f"Unauthorized: invalid/expired token on {request.path}")
             return jsonify(ok=False, error="invalid or expired token"), 401
         return f(*args, **kwargs)
     return inner
 
 # ---------------- Chrome profile handling ---------------- #
+# Cached profile listing; rebuilt only when USER_DATA_DIR or Local State changes
+_profiles_cache = {"mtime": 0, "ls_mtime": 0, "data": []}
+# Profile folder -> its mtime when a Bookmarks file was last seen in it. A later scan
+# skips the Bookmarks check while the folder mtime is unchanged; deleting Bookmarks or
+# recreating the folder changes it. Rebuilt from each scan, swapped in under _state_lock.
+_validated_profile_dirs = {}
+
+def _stat_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
 def get_logged_in_profiles():
+    global _validated_profile_dirs
+    local_state = os.path.join(USER_DATA_DIR, "Local State")
+    mtime = _stat_mtime(USER_DATA_DIR)
+    ls_mtime = _stat_mtime(local_state)
+    with _state_lock:
+        if mtime and _profiles_cache["mtime"] == mtime and _profiles_cache["ls_mtime"] == ls_mtime:
+            return _profiles_cache["data"]
+
     profiles = []
     try:
-        local_state = os.path.join(USER_DATA_DIR, "Local State")
         with open(local_state, "r", encoding="utf-8") as f:
             state = json.load(f)
         info_cache = state.get("profile", {}).get("info_cache", {})
     except Exception:
         info_cache = {}
 
+    with _state_lock:
+        previously_validated = _validated_profile_dirs
+    validated = {}
     try:
-        for folder in os.listdir(USER_DATA_DIR):
-            if folder == "Default" or folder.startswith("Profile "):
-                p_path = os.path.join(USER_DATA_DIR, folder)
-                if os.path.exists(os.path.join(p_path, "Bookmarks")):
-                    email = info_cache.get(folder, {}).get("user_name", "Unknown")
-                    profiles.append({"profile": folder, "email": email})
+        with os.scandir(USER_DATA_DIR) as it:
+            for entry in it:
+                folder = entry.name
+                if not (folder == "Default" or folder.startswith("Profile ")):
+                    continue
+                if not entry.is_dir():
+                    continue
+                folder_mtime = entry.stat().st_mtime  # served from the scandir data on Windows
+                if previously_validated.get(folder) != folder_mtime:
+                    if not os.path.exists(os.path.join(entry.path, "Bookmarks")):
+                        continue
+                validated[folder] = folder_mtime
+                email = info_cache.get(folder, {}).get("user_name", "Unknown")
+                profiles.append({"profile": folder, "email": email})
     except Exception as e:
         log(f"Error scanning profiles: {e}")
-    return sorted(profiles, key=lambda x: x["profile"])
+        return sorted(profiles, key=lambda x: x["profile"])
 
-def launch_profile(profile, email=None):
-    if profile in opened_profiles:
-        log(f"Profile already launched: {profile}")
-        return
+    profiles.sort(key=lambda x: x["profile"])
+    with _state_lock:
+        _validated_profile_dirs = validated
+        _profiles_cache["mtime"] = mtime
+        _profiles_cache["ls_mtime"] = ls_mtime
+        _profiles_cache["data"] = profiles
+    return profiles
+
+# Bounded pool for /launch_all so the request returns at once and Chrome starts in waves
+_launcher_pool = ThreadPoolExecutor(max_workers=SAFETY["max_concurrent_refreshes"], thread_name_prefix="launcher")
+
+def _claim_launch(profile):
+    """Reserve profile for launching; returns the launch generation, or None if already open/launching."""
+    with _state_lock:
+        if profile in opened_profiles or profile in _launching:
+            return None
+        _launching.add(profile)
+        return _launch_generation
+
+def _release_launch(profile, generation):
+    with _state_lock:
+        # a newer generation may have re-claimed the profile after close_all; leave that claim alone
+        if generation == _launch_generation:
+            _launching.discard(profile)
+
+def _spawn_profile(profile, email, generation):
+    """Launch Chrome for a claimed profile; False if the claim was invalidated by close_all."""
     options = [f"--profile-directory={profile}", "--autoplay-policy=no-user-gesture-required"]
-    proxy = profile_proxies.get(profile)
+    with _state_lock:
+        if generation != _launch_generation:
+            return False
+        proxy = profile_proxies.get(profile)
     if proxy:
         options.append(f"--proxy-server={proxy}")
     try:
         subprocess.Popen([CHROME_PATH] + options + [TARGET_URL])
-        opened_profiles.add(profile)
+        with _state_lock:
+            opened_profiles.add(profile)
         log(f"Launched {profile} ({email})")
     except Exception as e:
         log(f"Failed to launch {profile}: {e}")
         raise
+    finally:
+        _release_launch(profile, generation)
+    return True
 
-def close_all_profiles():
+def _launch_in_background(profile, email, generation):
+    try:
+        launched = _spawn_profile(profile, email, generation)
+    except Exception:
+        return  # already logged by _spawn_profile
+    if launched:
+        time.sleep(0.2)  # pace each worker like the old serial loop did
+
+def launch_profile(profile, email=None):
+    generation = _claim_launch(profile)
+    if generation is None:
+        log(f"Profile already launched: {profile}")
+        return
+    _spawn_profile(profile, email, generation)
+
+_CHROME_PROCESS_NAMES = {"chrome.exe", "chrome"}
+
+def _terminate_profile_processes(profiles):
+    """Terminate Chrome processes launched with --profile-directory=<one of profiles>."""
+    flags = {f"--profile-directory={p}" for p in profiles}
+    if not flags:
+        return 0
+    closed = 0
+    for proc in psutil.process_iter(["name", "cmdline"]):
+        try:
+            name = (proc.info["name"] or "").lower()
+            if name in _CHROME_PROCESS_NAMES and flags.intersection(proc.info["cmdline"] or ()):
+                proc.terminate()
+                closed += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return closed
+
+def _kill_all_chrome():
+    """Terminate every Chrome process by name; True if anything was closed."""
+    if psutil is not None:
+        closed = False
+        for proc in psutil.process_iter(["name"]):
+            try:
+                if (proc.info["name"] or "").lower() in _CHROME_PROCESS_NAMES:
+                    proc.terminate()
+                    closed = True
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return closed
     if platform.system() == "Windows":
         try:
-            subprocess.call("taskkill /F /IM chrome.exe", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            rc = subprocess.call("taskkill /F /IM chrome.exe", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return rc == 0
         except Exception:
             pass
-    opened_profiles.clear()
-    log("Closed all Chrome profiles")
+    return False
+
+def close_all_profiles():
+    global _launch_generation
+    with _state_lock:
+        # invalidate launches still queued on _launcher_pool so they don't reopen Chrome
+        _launch_generation += 1
+        pending = len(_launching)
+        _launching.clear()
+        targets = list(opened_profiles)
+    if pending:
+        log(f"Cancelled {pending} pending profile launches")
+    closed = 0
+    if psutil is not None and targets:
+        closed = _terminate_profile_processes(targets)
+    if closed:
+        log(f"Closed all launched Chrome profiles ({closed} processes)")
+    elif _kill_all_chrome():
+        # launches that handed off to an already-running Chrome leave no --profile-directory
+        # flag on the browser process, and after a restart nothing is on record: close by name
+        log("Closed all Chrome profiles")
+    else:
+        log("No Chrome processes were closed")
+        return
+    with _state_lock:
+        opened_profiles.clear()
 
 # ---------------- Per-profile state (safety) ---------------- #
-_profile_state = {}
+# Structure-of-arrays: one contiguous typed array per field, slot looked up via _ps_index.
+# All access must hold _profile_state_lock.
+_ps_names = []
+_ps_index = {}
+_ps_last_refresh = array("d")
+_ps_next_allowed = array("d")
+_ps_failures = array("i")
+_ps_quarantined = array("b")
+
+def _ps_slot(profile_name):
+    i = _ps_index.get(profile_name)
+    if i is None:
+        i = len(_ps_names)
+        _ps_names.append(profile_name)
+        _ps_index[profile_name] = i
+        _ps_last_refresh.append(0.0)
+        _ps_next_allowed.append(0.0)
+        _ps_failures.append(0)
+        _ps_quarantined.append(0)
+    return i
+
+def _profile_record(i):
+    return {
+        "last_refresh": _ps_last_refresh[i],
+        "failures": _ps_failures[i],
+        "next_allowed": _ps_next_allowed[i],
+        "quarantined": bool(_ps_quarantined[i]),
+    }
+
+def _set_profile_record(profile_name, v):
+    i = _ps_slot(profile_name)
+    _ps_last_refresh[i] = float(v.get("last_refresh", 0))
+    _ps_failures[i] = int(v.get("failures", 0))
+    _ps_next_allowed[i] = float(v.get("next_allowed", 0))
+    _ps_quarantined[i] = bool(v.get("quarantined", False))
 
 def _ensure_profile_state(profile_name):
-    if profile_name not in _profile_state:
-        _profile_state[profile_name] = {"last_refresh": 0, "failures": 0, "next_allowed": 0, "quarantined": False}
-    return _profile_state[profile_name]
+    """Return the slot index of profile_name, adding it if new. Caller must hold _profile_state_lock."""
+    i = _ps_index.get(profile_name)
+    if i is None:
+        i = _ps_slot(profile_name)
+        _append_state_event("ensure_profile", p=profile_name, s=_profile_record(i))
+    return i
 
 def _mark_success(profile_name):
-    st = _ensure_profile_state(profile_name)
-    st["last_refresh"] = time.time()
-    st["failures"] = 0
-    st["next_allowed"] = time.time()
-    st["quarantined"] = False
+    now = time.time()
+    with _profile_state_lock:
+        i = _ensure_profile_state(profile_name)
+        _ps_last_refresh[i] = now
+        _ps_failures[i] = 0
+        _ps_next_allowed[i] = now
+        _ps_quarantined[i] = False
+        _append_state_event("mark_success", p=profile_name, s=_profile_record(i))
 
 def _mark_failure(profile_name):
-    st = _ensure_profile_state(profile_name)
-    st["failures"] = st.get("failures", 0) + 1
-    backoff = SAFETY["failure_backoff_base"] * (2 ** (st["failures"] - 1))
-    backoff = min(backoff, 60 * 60 * 24)
-    st["next_allowed"] = time.time() + backoff
-    if st["failures"] >= SAFETY["failure_quarantine_threshold"]:
-        st["quarantined"] = True
-        log(f"[SAFETY] Quarantined profile {profile_name} after {st['failures']} failures (backoff {backoff}s).")
-
-def _is_allowed_to_refresh(profile_name):
-    st = _ensure_profile_state(profile_name)
-    if st.get("quarantined"):
-        return False, "quarantined"
-    if st.get("next_allowed", 0) > time.time():
-        return False, "backoff"
-    return True, None
+    now = time.time()
+    with _profile_state_lock:
+        i = _ensure_profile_state(profile_name)
+        _ps_failures[i] += 1
+        failures = _ps_failures[i]
+        backoff = SAFETY["failure_backoff_base"] * (2 ** (failures - 1))
+        backoff = min(backoff, 60 * 60 * 24)
+        _ps_next_allowed[i] = now + backoff
+        quarantined = failures >= SAFETY["failure_quarantine_threshold"]
+        if quarantined:
+            _ps_quarantined[i] = True
+        _append_state_event("mark_failure", p=profile_name, s=_profile_record(i))
+    if quarantined:
+        log(f"[SAFETY] Quarantined profile {profile_name} after {failures} failures (backoff {backoff}s).")
+
+def _defer_profile(profile_name, seconds):
+    with _profile_state_lock:
+        i = _ensure_profile_state(profile_name)
+        _ps_next_allowed[i] = time.time() + seconds
+        _append_state_event("long_break", p=profile_name, s=_profile_record(i))
+
+def _ready_profiles(profiles, now):
+    """Profiles that are neither quarantined nor backing off, checked in one pass."""
+    with _profile_state_lock:
+        return [
+            p for p in profiles
+            if (i := _ps_index.get(p["profile"])) is None
+            or (not _ps_quarantined[i] and _ps_next_allowed[i] <= now)
+        ]
 
 # ---------------- Human-like scheduling helpers ---------------- #
 def _now_hour():
     return time.localtime().tm_hour
 
-def _is_within_active_hours():
-    start = SAFETY["active_hours_start"]
-    end = SAFETY["active_hours_end"]
-    h = _now_hour()
-    if start <= end:
-        return start <= h < end
-    return h >= start or h < end
+def _compute_active_hour_mask(start, end):
+    """Bit h is set when hour h falls in [start, end), wrapping past midnight if start > end."""
+    return sum(
+        1 << h for h in range(24)
+        if start <= h < end or (start > end and (h >= start or h < end))
+    )
+
+_active_hour_mask = _compute_active_hour_mask(SAFETY["active_hours_start"], SAFETY["active_hours_end"])
+
+def _is_within_active_hours(hour=None):
+    if hour is None:
+        hour = _now_hour()
+    return (_active_hour_mask >> hour) & 1 == 1
 
-def _compute_delay_per_profile(total_profiles):
+def _compute_delay_per_profile(total_profiles, hour=None):
     if total_profiles <= 0:
         return SAFETY["min_delay_seconds"]
     base = max(SAFETY["min_delay_seconds"], (SAFETY["base_cycle_minutes"] * 60) // total_profiles)
-    jitter = secrets.randbelow(SAFETY["jitter_seconds"] * 2 + 1) - SAFETY["jitter_seconds"]
+    jitter = random.randint(-SAFETY["jitter_seconds"], SAFETY["jitter_seconds"])
     delay = max(SAFETY["min_delay_seconds"], base + jitter)
-    if not _is_within_active_hours():
+    if not _is_within_active_hours(hour):
         delay = int(delay * 1.5)
     return delay
 
 def _should_do_interaction():
-    return secrets.randbelow(100) < SAFETY["interaction_chance_pct"]
+    return random.randrange(100) < SAFETY["interaction_chance_pct"]
 
 def _should_take_long_break():
-    return secrets.randbelow(100) < SAFETY["long_break_chance_pct"]
+    return random.randrange(100) < SAFETY["long_break_chance_pct"]
 
 def _perform_human_like_interaction_simulated(profile_name):
     action = random.choice(["small_scroll", "hover", "pause"])
@@ -346,8 +748,16 @@ _rotation_state = {
     "last_cycle_ts": 0,
 }
 
+# (profiles list, group count, groups) from the last call. get_logged_in_profiles()
+# returns the same list object until its cache is rebuilt, so identity is the key.
+_rotation_groups_cache = (None, 0, None)
+
 def _compute_rotation_groups(profiles):
+    global _rotation_groups_cache
     n = max(1, _rotation_state["groups"])
+    cached_profiles, cached_n, cached_groups = _rotation_groups_cache
+    if cached_profiles is profiles and cached_n == n:
+        return cached_groups
     total = len(profiles)
     if total == 0:
         return [[] for _ in range(n)]
@@ -355,16 +765,22 @@ def _compute_rotation_groups(profiles):
     groups = [profiles[i * chunk:(i + 1) * chunk] for i in range(n)]
     while len(groups) < n:
         groups.append([])
+    _rotation_groups_cache = (profiles, n, groups)
     return groups
 
 def _next_rotation_group_index():
-    with _state_lock:
+    with _rotation_lock:
         _rotation_state["last_group"] = (_rotation_state["last_group"] + 1) % _rotation_state["groups"]
         _rotation_state["last_cycle_ts"] = time.time()
+        _append_state_event("rotation", s={
+            "last_group": _rotation_state["last_group"],
+            "last_cycle_ts": _rotation_state["last_cycle_ts"],
+        })
         return _rotation_state["last_group"]
 
 # ---------------- Background refresh (rotation + simulation) ---------------- #
 _stop_event = threading.Event()
+_safe_refresh_stop = threading.Event()
 _refresh_thread = None
 
 def _refresh_worker():
@@ -374,7 +790,8 @@ def _refresh_worker():
             profiles = get_logged_in_profiles()
             if not profiles:
                 log("No profiles found to refresh.")
-                time.sleep(10)
+                if _stop_event.wait(10):
+                    break
                 continue
 
             groups = _compute_rotation_groups(profiles)
@@ -383,23 +800,23 @@ def _refresh_worker():
             log(f"[ROTATION] Starting cycle for Group {group_index + 1} of {len(groups)} (profiles in group: {len(active_group)})")
 
             total_in_group = min(len(active_group), SAFETY["max_profiles_per_cycle"])
-            delay_per_profile = _compute_delay_per_profile(total_in_group if total_in_group > 0 else 1)
+            delay_per_profile = _compute_delay_per_profile(total_in_group if total_in_group > 0 else 1, _now_hour())
+
+            candidates = active_group[:SAFETY["max_profiles_per_cycle"]]
+            ready = _ready_profiles(candidates, time.time())
+            if len(ready) < len(candidates):
+                log(f"[ROTATION] Skipping {len(candidates) - len(ready)} profiles (quarantined/backoff)")
 
             refreshed = 0
-            for i, p in enumerate(active_group[:SAFETY["max_profiles_per_cycle"]]):
+            for p in ready:
                 if _stop_event.is_set():
                     break
                 profile_name = p["profile"]
                 email = p.get("email", "Unknown")
 
-                allowed, reason = _is_allowed_to_refresh(profile_name)
-                if not allowed:
-                    log(f"[ROTATION] Skipping {profile_name}: {reason}")
-                    continue
-
                 if _should_take_long_break():
-                    extra = secrets.randbelow(60 * 30)
-                    _ensure_profile_state(profile_name)["next_allowed"] = time.time() + extra
+                    extra = random.randrange(60 * 30)
+                    _defer_profile(profile_name, extra)
                     log(f"[ROTATION] Taking occasional long break for {profile_name} (+{extra}s)")
                     continue
 
@@ -413,14 +830,15 @@ def _refresh_worker():
                     log(f"[ROTATION] Error refreshing {profile_name}: {e}")
                     _mark_failure(profile_name)
 
-                time.sleep(delay_per_profile)
+                if _stop_event.wait(delay_per_profile):
+                    break
 
             log(f"[ROTATION] Completed cycle for Group {group_index + 1}. Refreshed: {refreshed}")
             # small buffer before next rotation
-            time.sleep(5)
+            _stop_event.wait(5)
         except Exception as e:
             log(f"Refresh loop error: {e}")
-            time.sleep(10)
+            _stop_event.wait(10)
     log("Background refresh worker stopped.")
 
 def start_refresh():
@@ -436,6 +854,7 @@ def start_refresh():
 
 def stop_refresh():
     global _refresh_thread
+    _safe_refresh_stop.set()
     if _refresh_thread:
         _stop_event.set()
         _refresh_thread.join(timeout=5)
@@ -444,28 +863,29 @@ def stop_refresh():
 
 # ---------------- Safe Refresh (single-cycle over one rotation group) ---------------- #
 def _safe_refresh_cycle_once():
+    _safe_refresh_stop.clear()
     profiles = get_logged_in_profiles()
     if not profiles:
         log("Safe refresh: no profiles found.")
         return 0
     groups = _compute_rotation_groups(profiles)
-    with _state_lock:
+    with _rotation_lock:
         next_idx = (_rotation_state["last_group"] + 1) % _rotation_state["groups"]
     active_group = groups[next_idx] if next_idx < len(groups) else []
     log(f"[SAFE_REFRESH] Performing safe refresh for Group {next_idx + 1} of {len(groups)} (size {len(active_group)})")
     total_in_group = min(len(active_group), SAFETY["max_profiles_per_cycle"])
-    delay_per_profile = _compute_delay_per_profile(total_in_group if total_in_group > 0 else 1)
+    delay_per_profile = _compute_delay_per_profile(total_in_group if total_in_group > 0 else 1, _now_hour())
+    candidates = active_group[:SAFETY["max_profiles_per_cycle"]]
+    ready = _ready_profiles(candidates, time.time())
+    if len(ready) < len(candidates):
+        log(f"[SAFE_REFRESH] Skipping {len(candidates) - len(ready)} profiles (quarantined/backoff)")
     refreshed = 0
-    for p in active_group[:SAFETY["max_profiles_per_cycle"]]:
+    for p in ready:
         profile_name = p["profile"]
         email = p.get("email", "Unknown")
-        allowed, reason = _is_allowed_to_refresh(profile_name)
-        if not allowed:
-            log(f"[SAFE_REFRESH] Skipping {profile_name}: {reason}")
-            continue
         if _should_take_long_break():
-            extra = secrets.randbelow(60 * 30)
-            _ensure_profile_state(profile_name)["next_allowed"] = time.time() + extra
+            extra = random.randrange(60 * 30)
+            _defer_profile(profile_name, extra)
             log(f"[SAFE_REFRESH] Taking occasional long break for {profile_name} (+{extra}s)")
             continue
         try:
@@ -477,7 +897,8 @@ def _safe_refresh_cycle_once():
         except Exception as e:
             log(f"[SAFE_REFRESH] Error refreshing {profile_name}: {e}")
             _mark_failure(profile_name)
-        time.sleep(delay_per_profile)
+        if _safe_refresh_stop.wait(delay_per_profile):
+            break
     log(f"[SAFE_REFRESH] Completed; refreshed {refreshed}")
     return refreshed
 
@@ -485,7 +906,7 @@ def _safe_refresh_cycle_once():
 @app.before_request
 def debug_request():
     try:
-        print(f"[REQ] {request.method} {request.path}")
+        _log_queue.put_nowait(f"[REQ] {request.method} {request.path}")
     except Exception:
         pass
 
@@ -498,7 +919,8 @@ def auth_login():
         return jsonify(ok=False, error="password required"), 400
     if verify_password(pw):
         token = generate_token()
-        _valid_tokens[token] = time.time() + TOKEN_TTL
+        with _state_lock:
+            _valid_tokens[token] = time.time() + TOKEN_TTL
         log("User logged in (token issued)")
         return jsonify(ok=True, token=token)
     return jsonify(ok=False, error="invalid password"), 403
@@ -507,13 +929,42 @@ def auth_login():
 @require_token
 def api_profiles():
     profs = get_logged_in_profiles()
-    return jsonify(ok=True, profiles=profs)
+    return json_response({"ok": True, "profiles": profs})
 
 @app.route("/logs", methods=["GET"])
 @require_token
 def api_logs():
-    with _state_lock:
-        return jsonify(ok=True, logs=list(_activity_log))
+    since = request.args.get("since")
+    if since is None:
+        with _log_lock:
+            logs = list(_activity_log)
+            seq = _log_seq
+        return json_response({"ok": True, "logs": logs, "last_seq": seq, "boot_id": _BOOT_ID})
+
+    # Incremental mode: stream only lines newer than `since` as NDJSON. The first record
+    # carries boot_id/last_seq; reset=true means the cursor is unusable (other process or
+    # fell out of the retained window) and the stream restarts from the oldest kept line.
+    try:
+        since = int(since)
+    except ValueError:
+        return jsonify(ok=False, error="since must be an integer"), 400
+    with _log_lock:
+        last_seq = _log_seq
+        first_seq = last_seq - len(_activity_log) + 1
+        reset = (
+            request.args.get("boot_id") != _BOOT_ID
+            or since + 1 < first_seq
+            or since > last_seq
+        )
+        skip = 0 if reset else since + 1 - first_seq
+        new_lines = list(islice(_activity_log, skip, None))
+    start = first_seq + skip
+
+    def generate():
+        yield _json_dumps({"boot_id": _BOOT_ID, "last_seq": last_seq, "reset": reset}) + b"\n"
+        for i, line in enumerate(new_lines, start):
+            yield _json_dumps({"i": i, "line": line}) + b"\n"
+    return Response(generate(), mimetype="application/x-ndjson")
 
 @app.route("/launch", methods=["POST"])
 @require_token
@@ -529,13 +980,20 @@ def api_launch():
 @app.route("/launch_all", methods=["POST"])
 @require_token
 def api_launch_all():
+    scheduled = 0
     for p in get_logged_in_profiles():
+        generation = _claim_launch(p["profile"])
+        if generation is None:
+            continue
         try:
-            launch_profile(p["profile"], p.get("email"))
-            time.sleep(0.2)
-        except Exception as e:
-            log(f"Error launching {p['profile']}: {e}")
-    return jsonify(ok=True)
+            _launcher_pool.submit(_launch_in_background, p["profile"], p.get("email"), generation)
+        except RuntimeError as e:  # pool already shut down
+            _release_launch(p["profile"], generation)
+            log(f"Cannot schedule launches: {e}")
+            break
+        scheduled += 1
+    log(f"Scheduled {scheduled} profile launches")
+    return jsonify(ok=True, scheduled=scheduled)
 
 @app.route("/start_refresh", methods=["POST"])
 @require_token
@@ -568,14 +1026,15 @@ def api_safe_refresh():
 @app.route("/quarantine/list", methods=["GET"])
 @require_token
 def api_quarantine_list():
-    items = []
-    for profile, st in _profile_state.items():
-        if st.get("quarantined"):
-            items.append({
-                "profile": profile,
-                "failures": st.get("failures", 0),
-                "next_allowed": st.get("next_allowed", 0),
-            })
+    with _profile_state_lock:
+        items = [
+            {
+                "profile": _ps_names[i],
+                "failures": _ps_failures[i],
+                "next_allowed": _ps_next_allowed[i],
+            }
+            for i, q in enumerate(_ps_quarantined) if q
+        ]
     return jsonify(ok=True, quarantined=items)
 
 @app.route("/quarantine/reset", methods=["POST"])
@@ -585,12 +1044,15 @@ def api_quarantine_reset():
     profile = data.get("profile")
     if not profile:
         return jsonify(ok=False, error="profile required"), 400
-    st = _profile_state.get(profile)
-    if not st:
+    with _profile_state_lock:
+        i = _ps_index.get(profile)
+        if i is not None:
+            _ps_failures[i] = 0
+            _ps_next_allowed[i] = 0
+            _ps_quarantined[i] = False
+            _append_state_event("quarantine_reset", p=profile, s=_profile_record(i))
+    if i is None:
         return jsonify(ok=False, error="profile not found in state"), 404
-    st["failures"] = 0
-    st["next_allowed"] = 0
-    st["quarantined"] = False
     log(f"Quarantine reset for {profile}")
     return jsonify(ok=True)
 
@@ -602,9 +1064,12 @@ def api_add_proxies():
     if not proxies or not isinstance(proxies, dict):
         log("/add_proxies called with no proxies; no action taken.")
         return jsonify(ok=True, message="no proxies applied (stub)")
-    for profile, proxy in proxies.items():
-        profile_proxies[profile] = proxy
-        log(f"Proxy set for {profile}: {proxy}")
+    with _state_lock:
+        profile_proxies.update(proxies)
+        _append_state_event("proxy", s=proxies)
+    names = list(proxies)
+    span = names[0] if len(names) == 1 else f"{names[0]} .. {names[-1]}"
+    log(f"Proxies set for {len(names)} profiles ({span})")
     return jsonify(ok=True, message="proxies applied")
 
 @app.route("/change_password", methods=["POST"])
@@ -623,12 +1088,14 @@ def api_dashboard_summary():
     profiles = get_logged_in_profiles()
     total = len(profiles)
     groups = _compute_rotation_groups(profiles)
-    with _state_lock:
+    with _rotation_lock:
         last_group = _rotation_state.get("last_group", -1)
         last_cycle_ts = _rotation_state.get("last_cycle_ts", 0)
-    quarantined = sum(1 for s in _profile_state.values() if s.get("quarantined"))
-    backing_off = sum(1 for s in _profile_state.values() if s.get("next_allowed", 0) > time.time())
-    return jsonify(ok=True, summary={
+    now = time.time()
+    with _profile_state_lock:
+        quarantined = _ps_quarantined.count(1)
+        backing_off = sum(1 for t in _ps_next_allowed if t > now)
+    return json_response({"ok": True, "summary": {
         "total_profiles": total,
         "rotation_groups": len(groups),
         "current_group_index": last_group,
@@ -636,7 +1103,7 @@ def api_dashboard_summary():
         "quarantined_profiles": quarantined,
         "profiles_in_backoff": backing_off,
         "last_cycle_time": last_cycle_ts,
-    })
+    }})
 
 @app.route("/", methods=["GET"])
 def root():
@@ -663,6 +1130,7 @@ if __name__ == "__main__":
         os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
     ensure_password_exists()
+    log(f"PBKDF2 backend: {PBKDF2_BACKEND}")
     log("🚀 Starting Flask server at http://127.0.0.1:5002")
 
     try:
@@ -7,7 +7,7 @@ REM Ensure pip is installed and upgraded
 "%PYTHON_PATH%" -m pip install --upgrade pip
 
 REM Install required modules
-"%PYTHON_PATH%" -m pip install flask pywin32 psutil pyautogui
+"%PYTHON_PATH%" -m pip install flask pywin32 psutil pyautogui orjson
 
 REM Show installed packages
 "%PYTHON_PATH%" -m pip list